@@ -28,8 +28,8 @@ class MongoDBConnection:
         try:
             self._client = MongoClient(
                 settings.mongodb_uri,
-                maxPoolSize=15,
-                minPoolSize=3,
+                maxPoolSize=50,
+                minPoolSize=5,
                 maxIdleTimeMS=60000,
                 serverSelectionTimeoutMS=7000,
                 connectTimeoutMS=15000,
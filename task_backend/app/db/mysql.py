@@ -129,18 +129,21 @@ class MySQLService:
             if ssh_tunnel:
                 ssh_tunnel.close()
     
-    def get_employee_tables(self) -> List[str]:
-        """Get list of employee-related tables in the database"""
-        with self.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = %s 
-                    AND table_name = 'up_users'
-                """, (self.mysql_database,))
-                result = cursor.fetchall()
-                return [row.get('table_name') or row.get('TABLE_NAME') for row in result]
+    def get_employee_tables(self, conn=None) -> List[str]:
+        """Get list of employee-related tables in the database (reuses conn when given)"""
+        if conn is None:
+            with self.get_connection() as conn:
+                return self.get_employee_tables(conn)
+        
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT table_name 
+                FROM information_schema.tables 
+                WHERE table_schema = %s 
+                AND table_name = 'up_users'
+            """, (self.mysql_database,))
+            result = cursor.fetchall()
+            return [row.get('table_name') or row.get('TABLE_NAME') for row in result]
     
     def get_table_structure(self, table_name: str) -> List[Dict[str, Any]]:
         """Get column information for a specific table"""
@@ -83,11 +83,11 @@ async def startup_event():
         client.admin.command('ping')
         db = client[settings.mongodb_db]
         
-        # Get collection counts
-        employee_count = db.employee.count_documents({})
-        tasks_count = db.tasks.count_documents({})
-        profile_count = db.profile_building.count_documents({})
-        permit_count = db.permit_files.count_documents({})
+        # Get collection counts (metadata counts, approximate is fine for logging)
+        employee_count = db.employee.estimated_document_count()
+        tasks_count = db.tasks.estimated_document_count()
+        profile_count = db.profile_building.estimated_document_count()
+        permit_count = db.permit_files.estimated_document_count()
         
         logger.info("✅ MongoDB connection successful!")
         logger.info(f"📋 Collections status:")
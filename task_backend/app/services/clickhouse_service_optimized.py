@@ -23,12 +23,31 @@ logger = logging.getLogger(__name__)
 CLICKHOUSE_ENABLED = True
 
 # Performance tuning constants
-BATCH_SIZE = 500  # Reduced from 1000
+BATCH_SIZE = 2000  # Mongo cursor batch; narrow projection keeps each batch small
+INSERT_BATCH_SIZE = 10000  # rows per INSERT; async inserts coalesce these server-side
 SYNC_INTERVAL = 900  # 15 minutes instead of 5
 CACHE_TTL = 300  # 5 minutes
 MAX_CONNECTIONS = 10
 QUERY_TIMEOUT = 30
 
+# Server-side async inserts for the bulk task_events path only: ClickHouse coalesces
+# concurrent INSERTs into one part, and still acks (or fails) once the data is written
+ASYNC_INSERT_SETTINGS = {
+    'async_insert': 1,
+    'wait_for_async_insert': 1,
+    'async_insert_max_data_size': 10 * 1024 * 1024,
+    'async_insert_busy_timeout_ms': 1000,
+}
+
+# Only the task fields _process_task_for_sync reads
+TASK_SYNC_PROJECTION = {
+    '_id': 1, 'task_id': 1, 'file_id': 1, 'source.permit_file_id': 1, 'permit_file_id': 1,
+    'work_started_at': 1, 'assigned_at': 1, 'created_at': 1, 'completed_at': 1,
+    'assigned_to': 1, 'assigned_to_name': 1, 'tracking_mode': 1, 'stage': 1, 'status': 1,
+    'skills_required': 1, 'priority': 1, 'title': 1
+}
+TASK_EVENTS_INSERT_SQL = 'INSERT INTO task_events_optimized (task_id, employee_code, employee_name, stage, status, assigned_at, completed_at, duration_minutes, file_id, tracking_mode, team_lead_id, skills_required, priority, event_type, task_name) VALUES'
+
 class OptimizedClickHouseService:
     """Optimized ClickHouse service with efficient resource usage"""
     
@@ -175,7 +194,7 @@ class OptimizedClickHouseService:
         db = get_db()
         employees = list(db.employee.find(
             {}, 
-            {"_id": 0, "employee_code": 1, "employee_name": 1, "reporting_manager": 1, "employment": 1}
+            {"_id": 0, "employee_code": 1, "employee_name": 1, "reporting_manager": 1, "employment.reporting_manager": 1}
         ))
         employee_lookup = {e.get("employee_code"): e for e in employees if e.get("employee_code")}
         
@@ -189,51 +208,70 @@ class OptimizedClickHouseService:
         
         return employee_lookup
     
-    async def sync_tasks_from_mongodb_optimized(self, since: Optional[datetime] = None):
-        """Optimized sync with streaming and batching"""
+    def invalidate_employee_lookup(self, cache_key: str = "sync_tasks"):
+        """Drop the cached employee lookup so the next sync sees renamed/reassigned employees"""
+        self._get_employee_lookup.cache_clear()
+        if self.redis_client:
+            try:
+                self.redis_client.delete(f"employee_lookup:{cache_key}")
+            except Exception as e:
+                logger.warning(f"Failed to clear employee lookup cache: {e}")
+    
+    async def sync_tasks_from_mongodb_optimized(self, since: Optional[datetime] = None, task_ids: Optional[List[Any]] = None):
+        """Optimized sync with streaming and batching (task_ids restricts the sync to those task _ids)"""
         if not CLICKHOUSE_ENABLED or not self.client:
             return
         
         try:
-            db = get_db()
-            
-            # Use cached employee lookup
-            employee_lookup = self._get_employee_lookup("sync_tasks")
-            
-            # Stream tasks from MongoDB with cursor
-            query = {"assigned_at": {"$gte": since}} if since else {}
-            cursor = db.tasks.find(query).sort("assigned_at", 1).batch_size(BATCH_SIZE)
-            
-            batch_rows = []
             total_processed = 0
-            skipped_count = 0
             
             with self.client.get_client() as client:
-                for task in cursor:
-                    # Process task (same logic as before but optimized)
-                    row_data = self._process_task_for_sync(task, employee_lookup)
-                    if row_data:
-                        batch_rows.append(row_data)
-                    else:
-                        skipped_count += 1
-                    
-                    # Insert in batches
-                    if len(batch_rows) >= BATCH_SIZE:
-                        await self._insert_batch(client, batch_rows)
-                        total_processed += len(batch_rows)
-                        batch_rows = []
-                        logger.info(f"Processed {total_processed} tasks...")
-                
-                # Insert remaining rows
-                if batch_rows:
+                for batch_rows in self.iter_task_row_batches(since=since, task_ids=task_ids):
                     await self._insert_batch(client, batch_rows)
                     total_processed += len(batch_rows)
+                    logger.info(f"Processed {total_processed} tasks...")
             
-            logger.info(f"✅ Synced {total_processed} tasks to ClickHouse (skipped {skipped_count})")
+            logger.info(f"✅ Synced {total_processed} tasks to ClickHouse")
             
         except Exception as e:
             logger.error(f"Failed to sync tasks to ClickHouse: {e}")
     
+    def iter_task_row_batches(self, since: Optional[datetime] = None, task_ids: Optional[List[Any]] = None,
+                              batch_size: int = INSERT_BATCH_SIZE) -> Iterator[List[Tuple]]:
+        """Stream tasks from MongoDB and yield ClickHouse task_events rows in batches"""
+        db = get_db()
+        
+        # Use cached employee lookup
+        employee_lookup = self._get_employee_lookup("sync_tasks")
+        
+        # Stream tasks from MongoDB with cursor
+        query = {"assigned_at": {"$gte": since}} if since else {}
+        if task_ids is not None:
+            query["_id"] = {"$in": task_ids}
+        cursor = db.tasks.find(query, TASK_SYNC_PROJECTION).sort("assigned_at", 1).batch_size(BATCH_SIZE)
+        
+        batch_rows = []
+        skipped_count = 0
+        
+        for task in cursor:
+            # Process task (same logic as before but optimized)
+            row_data = self._process_task_for_sync(task, employee_lookup)
+            if row_data:
+                batch_rows.append(row_data)
+            else:
+                skipped_count += 1
+            
+            if len(batch_rows) >= batch_size:
+                yield batch_rows
+                batch_rows = []
+        
+        # Remaining rows
+        if batch_rows:
+            yield batch_rows
+        
+        if skipped_count:
+            logger.info(f"Skipped {skipped_count} tasks without file_id/timestamp during ClickHouse sync")
+    
     def _process_task_for_sync(self, task: Dict, employee_lookup: Dict) -> Optional[Tuple]:
         """Process single task for sync - extracted for clarity"""
         # Extract and validate file_id
@@ -288,14 +326,77 @@ class OptimizedClickHouseService:
     async def _insert_batch(self, client: Client, batch_rows: List[Tuple]):
         """Insert batch with error handling"""
         try:
-            client.execute(
-                'INSERT INTO task_events_optimized (task_id, employee_code, employee_name, stage, status, assigned_at, completed_at, duration_minutes, file_id, tracking_mode, team_lead_id, skills_required, priority, event_type, task_name) VALUES',
-                batch_rows
-            )
+            client.execute(TASK_EVENTS_INSERT_SQL, batch_rows, settings=ASYNC_INSERT_SETTINGS)
         except Exception as e:
             logger.error(f"Batch insert failed: {e}")
             # Optionally implement retry logic here
     
+    def build_task_rows(self, tasks: List[Dict]) -> List[Tuple]:
+        """Turn already-fetched task documents into task_events rows"""
+        employee_lookup = self._get_employee_lookup("sync_tasks")
+        rows = (self._process_task_for_sync(task, employee_lookup) for task in tasks)
+        return [row for row in rows if row]
+    
+    def insert_task_rows(self, batch_rows: List[Tuple], raise_on_error: bool = False) -> int:
+        """Insert one batch on its own pooled connection (safe to call from worker threads)"""
+        if not CLICKHOUSE_ENABLED or not self.client:
+            return 0
+        
+        try:
+            with self.client.get_client() as client:
+                client.execute(TASK_EVENTS_INSERT_SQL, batch_rows, settings=ASYNC_INSERT_SETTINGS)
+            return len(batch_rows)
+        except Exception as e:
+            logger.error(f"Batch insert failed: {e}")
+            if raise_on_error:
+                raise
+            return 0
+    
+    def flush_async_inserts(self):
+        """Block until buffered async inserts are written to their parts"""
+        if not CLICKHOUSE_ENABLED or not self.client:
+            return
+        
+        try:
+            with self.client.get_client() as client:
+                client.execute("SYSTEM FLUSH ASYNC INSERT QUEUE")
+        except Exception as e:
+            logger.error(f"Failed to flush async insert queue: {e}")
+    
+    def optimize_recent_partitions(self, days: int = 2) -> int:
+        """Force-merge the last `days` date partitions of task_events_optimized if they are split into several parts.
+
+        Older partitions are left to ReplacingMergeTree's background merges so
+        re-synced history never turns maintenance into a full-table FINAL.
+        """
+        if not CLICKHOUSE_ENABLED or not self.client:
+            return 0
+        
+        try:
+            with self.client.get_client() as client:
+                # Server-side today() matches the toDate(assigned_at) partition key's timezone
+                partitions = client.execute("""
+                    SELECT partition_id
+                    FROM system.parts
+                    WHERE database = currentDatabase()
+                      AND table = 'task_events_optimized'
+                      AND active
+                      AND min_date >= today() - %(days)s
+                    GROUP BY partition_id
+                    HAVING count() > 1
+                """, {'days': max(days - 1, 0)})
+                optimized = 0
+                for (partition_id,) in partitions:
+                    try:
+                        client.execute(f"OPTIMIZE TABLE task_events_optimized PARTITION ID '{partition_id}' FINAL")
+                        optimized += 1
+                    except Exception as e:
+                        logger.error(f"Failed to optimize partition {partition_id}: {e}")
+                return optimized
+        except Exception as e:
+            logger.error(f"Failed to list recent partitions: {e}")
+            return 0
+    
     def get_dashboard_analytics_optimized(self, days: int = 7) -> Optional[Dict]:
         """Optimized dashboard analytics with caching"""
         if not CLICKHOUSE_ENABLED or not self.client:
@@ -4,14 +4,30 @@ Handles syncing employee data from SQL (source of truth) to MongoDB (extended da
 """
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional
+from operator import itemgetter
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from app.db.mongodb import get_db
 from app.db.mysql import mysql_service
 from app.services.notification_service import get_notification_service
 
 logger = logging.getLogger(__name__)
 
+# Static part of the sync_info sub-document shared by every mapped employee
+_SYNC_INFO_TEMPLATE = {"sql_source": True}
+
+# C-level extractor for the 3 up_users columns read per row
+_get_core_fields = itemgetter('kekaemployeenumber', 'fullname', 'email')
+
+# Full employee sync pipeline tuning
+SQL_CHUNK_SIZE = 1000  # codes per IN (...) query
+SYNC_QUEUE_SIZE = 4  # pending bulk writes buffered between SQL and Mongo
+SYNC_CONSUMERS = 4  # concurrent Mongo bulk writers
+MAX_ERROR_SAMPLES = 50  # failures kept verbatim in sync results
+NOTIFICATION_BATCH_SIZE = 50  # skills-collection invitations sent per drain step
+
 class SQLToMongoSyncService:
     """Service for syncing SQL data to MongoDB"""
     
@@ -19,23 +35,24 @@ class SQLToMongoSyncService:
         self.mysql_service = mysql_service
         self.employee_table_name = None
         self.permit_files_table_name = None
+        self._pending_notifications: List[Tuple[str, str]] = []
+        self._drain_task: Optional[asyncio.Task] = None
     
     async def initialize(self):
         """Initialize the sync service by discovering table structures"""
         try:
-            # Discover employee table
-            employee_tables = self.mysql_service.get_employee_tables()
-            if employee_tables:
-                self.employee_table_name = employee_tables[0]
-                logger.info(f"Using employee table: {self.employee_table_name}")
+            # One connection (and SSH tunnel) for all discovery queries
+            with self.mysql_service.get_connection() as conn:
+                # Discover employee table
+                employee_tables = self.mysql_service.get_employee_tables(conn)
+                if employee_tables:
+                    self.employee_table_name = employee_tables[0]
+                    logger.info(f"Using employee table: {self.employee_table_name}")
+                else:
+                    raise ValueError("No employee tables found in SQL database")
                 
-                # Get table structure (no logging of column details)
-            else:
-                raise ValueError("No employee tables found in SQL database")
-            
-            # Discover permit files table
-            try:
-                with self.mysql_service.get_connection() as conn:
+                # Discover permit files table
+                try:
                     with conn.cursor() as cursor:
                         cursor.execute("""
                             SELECT table_name 
@@ -47,31 +64,33 @@ class SQLToMongoSyncService:
                         if result:
                             self.permit_files_table_name = result[0].get('table_name') or result[0].get('TABLE_NAME')
                             logger.info(f"Using permit files table: {self.permit_files_table_name}")
-            except Exception as e:
-                logger.warning(f"Could not find permit files table: {e}")
+                except Exception as e:
+                    logger.warning(f"Could not find permit files table: {e}")
                 
         except Exception as e:
             logger.error(f"Failed to initialize sync service: {e}")
             raise
     
-    def map_sql_to_mongo_employee(self, sql_employee: Dict[str, Any]) -> Dict[str, Any]:
-        """Map SQL employee data to MongoDB format"""
+    def map_sql_to_mongo_employee(self, sql_employee: Dict[str, Any], sync_ts: Optional[datetime] = None) -> Dict[str, Any]:
+        """Map SQL employee data to MongoDB format (sync_ts lets bulk syncs share one timestamp)"""
         # Use kekaemployeenumber (not kekaemployeecode)
-        kekaemployeenumber = sql_employee.get('kekaemployeenumber')
+        try:
+            kekaemployeenumber, fullname, email = _get_core_fields(sql_employee)
+        except KeyError:
+            # Partial payloads (e.g. webhooks) may omit some columns
+            kekaemployeenumber = sql_employee.get('kekaemployeenumber')
+            fullname = sql_employee.get('fullname')
+            email = sql_employee.get('email')
         if not kekaemployeenumber:
             return None
         
         # Map only the 3 fields that exist in up_users
         mapped_employee = {
             "kekaemployeecode": kekaemployeenumber,  # Map kekaemployeenumber to kekaemployeecode
-            "employee_name": sql_employee.get('fullname'),  # Use fullname field
-            "contact_email": sql_employee.get('email'),  # Use email field
+            "employee_name": fullname,  # Use fullname field
+            "contact_email": email,  # Use email field
             # Sync metadata
-            "sync_info": {
-                "sql_source": True,
-                "last_synced": datetime.utcnow(),
-                "sync_version": 1
-            }
+            "sync_info": {**_SYNC_INFO_TEMPLATE, "last_synced": sync_ts or datetime.utcnow(), "sync_version": 1}
         }
         
         # Remove None values
@@ -86,24 +105,17 @@ class SQLToMongoSyncService:
                 return None
             kekaemployeecode = mapped_employee["kekaemployeecode"]
             
-            # Check if employee already exists
-            existing_employee = db.employee.find_one({"kekaemployeecode": kekaemployeecode})
+            # Check if employee already exists (only fetch the fields read below)
+            existing_employee = db.employee.find_one(
+                {"kekaemployeecode": kekaemployeecode},
+                {"sync_info.sync_version": 1, "skills": 1, "technical_skills": 1}
+            )
             
             if existing_employee:
-                # Update existing employee with SQL master data
+                # Update existing employee with SQL master data only; $set leaves
+                # MongoDB-specific fields (skills, embedding, metadata, ...) untouched
                 update_data = {k: v for k, v in mapped_employee.items() if k != "kekaemployeecode"}
-                
-                # Preserve existing skills, tasks, analytics, and other MongoDB-specific data
-                preserved_fields = [
-                    "skills", "technical_skills", "raw_technical_skills", "raw_strength_expertise",
-                    "embedding", "metadata", "list_of_task_assigned", "special_task",
-                    "onboarding", "tasks_assigned", "performance_metrics"
-                ]
-                
-                for field in preserved_fields:
-                    if field in existing_employee:
-                        update_data[field] = existing_employee[field]
-                
+
                 # Update sync info
                 update_data["sync_info"] = {
                     "sql_source": True,
@@ -120,7 +132,7 @@ class SQLToMongoSyncService:
                 
                 # Check if skills need to be collected
                 if not existing_employee.get("skills") and not existing_employee.get("technical_skills"):
-                    await self._trigger_skills_collection(kekaemployeecode, mapped_employee.get("employee_name"))
+                    self._queue_skills_collection(kekaemployeecode, mapped_employee.get("employee_name"))
                 
             else:
                 # Create new employee record
@@ -134,49 +146,38 @@ class SQLToMongoSyncService:
                 logger.info(f"Created new employee {kekaemployeecode} from SQL")
                 
                 # Trigger skills collection for new employee
-                await self._trigger_skills_collection(kekaemployeecode, mapped_employee.get("employee_name"))
+                self._queue_skills_collection(kekaemployeecode, mapped_employee.get("employee_name"))
             
             return mapped_employee
             
         except Exception as e:
             return None
     
-    async def sync_employee_update(self, sql_employee: Dict[str, Any]) -> Dict[str, Any]:
+    async def sync_employee_update(self, sql_employee: Dict[str, Any], sync_ts: Optional[datetime] = None) -> Dict[str, Any]:
         """Update existing employee with SQL data (only email and fullname)"""
         try:
             db = get_db()
-            mapped_employee = self.map_sql_to_mongo_employee(sql_employee)
+            mapped_employee = self.map_sql_to_mongo_employee(sql_employee, sync_ts)
             if not mapped_employee:
                 return None
             
             kekaemployeecode = mapped_employee["kekaemployeecode"]
             
-            # Get existing employee from MongoDB
-            existing_employee = db.employee.find_one({"kekaemployeecode": kekaemployeecode})
+            # Only update the 3 fields from SQL, preserve everything else; the
+            # version bump happens server-side in the same round trip
+            updated = db.employee.find_one_and_update(
+                {"kekaemployeecode": kekaemployeecode},
+                self._build_sql_update(mapped_employee),
+                projection={"_id": 0, "kekaemployeecode": 1, "sync_info": 1},
+                return_document=ReturnDocument.AFTER
+            )
             
-            if not existing_employee:
+            if updated is None:
                 logger.warning(f"Employee {kekaemployeecode} not found in MongoDB for update")
                 return None
             
-            # Only update the 3 fields from SQL, preserve everything else
-            update_data = {
-                "employee_name": mapped_employee.get("employee_name"),
-                "contact_email": mapped_employee.get("contact_email"),
-                "sync_info": {
-                    "sql_source": True,
-                    "last_synced": datetime.utcnow(),
-                    "sync_version": existing_employee.get("sync_info", {}).get("sync_version", 0) + 1
-                }
-            }
-            
-            # Perform update
-            db.employee.update_one(
-                {"kekaemployeecode": kekaemployeecode},
-                {"$set": update_data}
-            )
-            
             logger.info(f"Updated employee {kekaemployeecode} with SQL data (email, fullname)")
-            return mapped_employee
+            return {**mapped_employee, "sync_info": updated.get("sync_info", mapped_employee["sync_info"])}
             
         except Exception as e:
             logger.error(f"Error syncing employee update {sql_employee}: {e}")
@@ -189,63 +190,133 @@ class SQLToMongoSyncService:
             
             db = get_db()
             
-            # Step 1: Get all existing employees from MongoDB
-            mongo_employees = list(db.employee.find({}, {"kekaemployeecode": 1}))
-            mongo_employee_codes = {emp["kekaemployeecode"] for emp in mongo_employees}
+            # Step 1: Stream existing employee codes from MongoDB
+            cursor = db.employee.find({}, {"kekaemployeecode": 1, "_id": 0}).batch_size(5000)
+            mongo_employee_codes = {emp["kekaemployeecode"] for emp in cursor}
             
             sync_results = {
-                "total_mongo_employees": len(mongo_employees),
+                "total_mongo_employees": len(mongo_employee_codes),
                 "matched_in_sql": 0,
                 "updated": 0,
                 "not_found_in_sql": [],
-                "errors": []
+                "error_count": 0,
+                "error_samples": []
             }
             
+            def record_error(kekaemployeecode, error):
+                sync_results["error_count"] += 1
+                if len(sync_results["error_samples"]) < MAX_ERROR_SAMPLES:
+                    sync_results["error_samples"].append((kekaemployeecode, repr(error)[:200]))
+                logger.debug(f"Error syncing employee {kekaemployeecode}: {error}")
+            
             if not mongo_employee_codes:
                 logger.info("No employees found in MongoDB to sync")
                 return sync_results
             
-            # Step 2: Fetch only matching employees from SQL
-            # Build WHERE clause for kekaemployeenumber
+            # Step 2/3: Stream SQL chunks into Mongo bulk writes. The producer fetches the
+            # next chunk from SQL while consumers apply the previous chunks' updates.
             employee_codes_list = list(mongo_employee_codes)
-            placeholders = ', '.join(['%s'] * len(employee_codes_list))
+            now = datetime.utcnow()  # one timestamp for the whole run
+            queue: asyncio.Queue = asyncio.Queue(maxsize=SYNC_QUEUE_SIZE)
             
-            sql_employees = []
-            with self.mysql_service.get_connection() as conn:
-                with conn.cursor() as cursor:
-                    query = f"SELECT kekaemployeenumber, fullname, email FROM {self.employee_table_name} WHERE kekaemployeenumber IN ({placeholders})"
-                    cursor.execute(query, employee_codes_list)
-                    sql_employees = cursor.fetchall()
+            async def produce():
+                try:
+                    with self.mysql_service.get_connection() as conn:
+                        for i in range(0, len(employee_codes_list), SQL_CHUNK_SIZE):
+                            chunk = employee_codes_list[i:i + SQL_CHUNK_SIZE]
+                            sql_employees = await asyncio.to_thread(self._fetch_sql_employees, conn, chunk)
+                            sql_employee_map = {emp['kekaemployeenumber']: emp for emp in sql_employees}
+                            
+                            ops, op_codes = [], []
+                            for kekaemployeecode in chunk:
+                                sql_emp = sql_employee_map.get(kekaemployeecode)
+                                if sql_emp:
+                                    op = self._build_update_op(sql_emp, now)
+                                    if op is not None:
+                                        ops.append(op)
+                                        op_codes.append(kekaemployeecode)
+                                    sync_results["matched_in_sql"] += 1
+                                else:
+                                    # Employee not found in SQL
+                                    sync_results["not_found_in_sql"].append(kekaemployeecode)
+                                    logger.warning(f"Employee {kekaemployeecode} not found in SQL table")
+                            
+                            if ops:
+                                await queue.put((op_codes, ops))
+                finally:
+                    for _ in range(SYNC_CONSUMERS):
+                        await queue.put(None)
             
-            # Create a mapping of kekaemployeenumber to employee data
-            sql_employee_map = {emp['kekaemployeenumber']: emp for emp in sql_employees}
+            async def consume():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    op_codes, ops = item
+                    try:
+                        result = await asyncio.to_thread(db.employee.bulk_write, ops, ordered=False)
+                        sync_results["updated"] += result.matched_count
+                    except BulkWriteError as e:
+                        sync_results["updated"] += e.details.get("nMatched", 0)
+                        for write_error in e.details.get("writeErrors", []):
+                            record_error(op_codes[write_error.get("index", 0)], write_error.get("errmsg"))
+                    except Exception as e:
+                        for kekaemployeecode in op_codes:
+                            record_error(kekaemployeecode, e)
             
-            # Step 3: Update only existing MongoDB employees
-            for kekaemployeecode in mongo_employee_codes:
-                try:
-                    sql_emp = sql_employee_map.get(kekaemployeecode)
-                    
-                    if sql_emp:
-                        # Employee found in SQL, update MongoDB
-                        await self.sync_employee_update(sql_emp)
-                        sync_results["updated"] += 1
-                        sync_results["matched_in_sql"] += 1
-                    else:
-                        # Employee not found in SQL
-                        sync_results["not_found_in_sql"].append(kekaemployeecode)
-                        logger.warning(f"Employee {kekaemployeecode} not found in SQL table")
-                    
-                except Exception as e:
-                    sync_results["errors"].append(f"Sync error for {kekaemployeecode}: {e}")
-                    logger.error(f"Error syncing employee {kekaemployeecode}: {e}")
+            await asyncio.gather(produce(), *[consume() for _ in range(SYNC_CONSUMERS)])
             
-            logger.info(f"Sync completed: {sync_results['updated']} updated, {sync_results['matched_in_sql']} matched in SQL, {len(sync_results['not_found_in_sql'])} not found")
+            logger.info(f"Sync completed: {sync_results['updated']} updated, {sync_results['matched_in_sql']} matched in SQL, {len(sync_results['not_found_in_sql'])} not found, {sync_results['error_count']} errors")
             return sync_results
             
         except Exception as e:
             logger.error(f"Employee sync failed: {e}")
             raise
     
+    def _fetch_sql_employees(self, conn, employee_codes: List[str]) -> List[Dict[str, Any]]:
+        """Fetch the SQL master fields for one chunk of employee codes"""
+        placeholders = ', '.join(['%s'] * len(employee_codes))
+        with conn.cursor() as cursor:
+            query = f"SELECT kekaemployeenumber, fullname, email FROM {self.employee_table_name} WHERE kekaemployeenumber IN ({placeholders})"
+            cursor.execute(query, employee_codes)
+            return cursor.fetchall()
+    
+    def _build_sql_update(self, mapped_employee: Dict[str, Any]) -> Dict[str, Any]:
+        """Update document writing the SQL master fields and bumping sync_version server-side"""
+        sync_info = mapped_employee["sync_info"]
+        return {
+            "$set": {
+                "employee_name": mapped_employee.get("employee_name"),
+                "contact_email": mapped_employee.get("contact_email"),
+                "sync_info.sql_source": sync_info["sql_source"],
+                "sync_info.last_synced": sync_info["last_synced"]
+            },
+            "$inc": {"sync_info.sync_version": 1}
+        }
+    
+    def _build_update_op(self, sql_employee: Dict[str, Any], sync_ts: datetime) -> Optional[UpdateOne]:
+        """Build the SQL-field update for one existing employee (bulk counterpart of sync_employee_update)"""
+        mapped_employee = self.map_sql_to_mongo_employee(sql_employee, sync_ts)
+        if not mapped_employee:
+            return None
+        return UpdateOne({"kekaemployeecode": mapped_employee["kekaemployeecode"]}, self._build_sql_update(mapped_employee))
+    
+    def _queue_skills_collection(self, kekaemployeecode: str, employee_name: str):
+        """Queue a skills-collection invitation without blocking the caller on delivery"""
+        self._pending_notifications.append((kekaemployeecode, employee_name))
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.create_task(self._drain_notifications())
+    
+    async def _drain_notifications(self):
+        """Send queued skills-collection invitations in batches"""
+        while self._pending_notifications:
+            batch = self._pending_notifications[:NOTIFICATION_BATCH_SIZE]
+            del self._pending_notifications[:NOTIFICATION_BATCH_SIZE]
+            await asyncio.gather(*[
+                self._trigger_skills_collection(kekaemployeecode, employee_name)
+                for kekaemployeecode, employee_name in batch
+            ])
+    
     async def _trigger_skills_collection(self, kekaemployeecode: str, employee_name: str):
         """Trigger skills collection for a new employee"""
         try:
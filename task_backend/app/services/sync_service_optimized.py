@@ -4,26 +4,59 @@ Event-driven, efficient synchronization with minimal resource usage
 """
 import asyncio
 import logging
+from contextlib import AsyncExitStack
 from datetime import datetime, timedelta
-from typing import Optional, Set, Dict, Any
+from typing import Optional, Set, Dict, Any, List
 import json
-from collections import defaultdict
 import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
+from bson import json_util
+from pymongo import DESCENDING
+from pymongo.errors import PyMongoError
+
+from app.services.clickhouse_service import clickhouse_service
 from app.services.clickhouse_service_optimized import optimized_clickhouse_service
 from app.db.mongodb import get_db
 
 logger = logging.getLogger(__name__)
 
+# Collections whose changes are pushed to ClickHouse
+WATCHED_COLLECTIONS = ['tasks', 'employee', 'file_stage_tracking']
+RESUME_TOKEN_KEY = "sync:change_stream_resume_token"
+CHANGE_FLUSH_SIZE = 500  # events per ClickHouse flush
+CHANGE_FLUSH_INTERVAL = 1.0  # seconds before a partial batch is flushed
+CHANGE_RETRY_MAX_DELAY = 60  # seconds between retries of a failed change batch
+CHANGE_MAX_ATTEMPTS = 8  # flush attempts before a batch is dead-lettered (~2 min of backoff)
+DEAD_LETTER_KEY = "sync:change_stream_dead_letter"
+DEAD_LETTER_MAX = 10000  # dead-lettered event ids kept in Redis
+CHANGE_PROBE_CACHE_TTL = 60  # seconds a detect_changes result is reused
+SYNC_QUEUE_SIZE = 4  # row batches buffered between Mongo reader and ClickHouse writers
+SYNC_CONSUMERS = 4  # ClickHouse insert batches in flight at once
+CLICKHOUSE_WORKERS = SYNC_CONSUMERS  # threads reserved for blocking clickhouse-driver calls
+MIN_CHANGE_PROBE_AGE = timedelta(minutes=5)  # don't probe right after a sync
+# detect_changes key -> per-collection sync lock
+CHANGE_LOCKS = {'tasks': 'tasks', 'employees': 'employee', 'stage_tracking': 'stage_tracking'}
+
 class OptimizedSyncService:
     """Optimized sync service with event-driven approach"""
     
     def __init__(self):
         self.last_sync_time = None
+        self._db_handle = None  # resolved on first use so importing the module doesn't ping Mongo
         self.sync_interval = 900  # 15 minutes (reduced frequency)
-        self.batch_size = 500  # Smaller batches
-        self.sync_lock = asyncio.Lock()
-        self.change_tracker = defaultdict(set)  # Track changes by collection
+        self.batch_size = 10000  # Rows per ClickHouse insert batch
+        self._locks = {name: asyncio.Lock() for name in ('tasks', 'employee', 'stage_tracking', 'daily')}
+        self._change_queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+        self._hot_queue: asyncio.Queue = asyncio.Queue()  # (kind, id) from sync_specific_task/lifecycle hooks
+        self._hot_flusher_task: Optional[asyncio.Task] = None
+        # Dedicated pool so ClickHouse calls don't compete with Mongo reads on the default executor
+        self._clickhouse_executor = ThreadPoolExecutor(max_workers=CLICKHOUSE_WORKERS, thread_name_prefix="clickhouse-sync")
+        self._change_probe_cache: Optional[tuple] = None  # (last_sync_time, probed_at, changes)
+        self._change_indexes_ready = False
+        # detect_changes key -> start of a window the night probe skipped; kept until that collection syncs
+        self._unprobed_since: Dict[str, datetime] = {}
         self.performance_metrics = {
             'last_sync_duration': 0,
             'total_synced': 0,
@@ -31,6 +64,13 @@ class OptimizedSyncService:
             'avg_cpu_usage': 0
         }
     
+    @property
+    def _db(self):
+        """Shared database handle, fetched once (get_db pings the server on every call)"""
+        if self._db_handle is None:
+            self._db_handle = get_db()
+        return self._db_handle
+    
     async def start_optimized_sync_worker(self):
         """Optimized background worker with adaptive scheduling"""
         logger.info("🚀 Starting optimized sync worker (15-minute interval)")
@@ -70,49 +110,214 @@ class OptimizedSyncService:
                 else:
                     await asyncio.sleep(60)  # Wait before retrying
     
+    async def start_event_driven_sync_worker(self):
+        """Push-based sync: stream MongoDB changes to ClickHouse as they happen.
+
+        Change Streams need a replica set; on standalone servers this falls back
+        to the polling worker.
+        """
+        logger.info("🚀 Starting change stream sync worker")
+        
+        try:
+            # Bring ClickHouse up to date before tailing changes
+            if self.last_sync_time is None and self._load_resume_token() is None:
+                await self.perform_initial_sync()
+                self.last_sync_time = datetime.utcnow()
+            
+            workers = [
+                asyncio.create_task(self._changestream_worker()),
+                asyncio.create_task(self._change_flusher()),
+                asyncio.create_task(self._daily_sync_scheduler())
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        except PyMongoError as e:
+            logger.warning(f"Change streams unavailable ({e}), falling back to polling sync")
+            await self.start_optimized_sync_worker()
+    
+    async def _changestream_worker(self):
+        """Tail the database change stream and queue changes for the watched collections"""
+        db = self._db
+        pipeline = [{'$match': {'ns.coll': {'$in': WATCHED_COLLECTIONS}}}]
+        
+        with db.watch(
+            pipeline=pipeline,
+            full_document='updateLookup',
+            resume_after=self._load_resume_token(),
+            max_await_time_ms=1000
+        ) as stream:
+            while stream.alive:
+                # try_next blocks for at most max_await_time_ms
+                event = await asyncio.to_thread(stream.try_next)
+                if event is None:
+                    continue
+                await self._change_queue.put({
+                    'collection': event['ns']['coll'],
+                    'document_id': event.get('documentKey', {}).get('_id'),
+                    'full_document': event.get('fullDocument'),
+                    'resume_token': event['_id']
+                })
+    
+    async def _collect_batch(self, queue: asyncio.Queue) -> List[Any]:
+        """Wait for one item, then keep collecting until the flush size or interval is reached"""
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + CHANGE_FLUSH_INTERVAL
+        
+        while len(batch) < CHANGE_FLUSH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _change_flusher(self):
+        """Drain queued changes into size/time-bounded batches and sync them to ClickHouse"""
+        while True:
+            batch = await self._collect_batch(self._change_queue)
+            
+            # Retry with backoff; the stream backs up behind the bounded queue meanwhile
+            delay = 1
+            for attempt in range(1, CHANGE_MAX_ATTEMPTS + 1):
+                try:
+                    await self._flush_changes(batch)
+                    break
+                except Exception as e:
+                    self.performance_metrics['errors'] += 1
+                    if attempt == CHANGE_MAX_ATTEMPTS:
+                        # A batch ClickHouse keeps rejecting must not stall the stream forever
+                        logger.error(f"Giving up on {len(batch)} changes after {attempt} attempts: {e}")
+                        self._dead_letter(batch)
+                        break
+                    logger.error(f"Failed to flush {len(batch)} changes to ClickHouse, retrying in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, CHANGE_RETRY_MAX_DELAY)
+            
+            # Advance the resume point once the batch is in ClickHouse or dead-lettered
+            self._save_resume_token(batch[-1]['resume_token'])
+    
+    def _dead_letter(self, batch: List[Dict[str, Any]]):
+        """Record the ids of change events that could not be synced so they can be replayed by hand"""
+        entries = [
+            json_util.dumps({'collection': change['collection'], 'document_id': change['document_id']})
+            for change in batch
+        ]
+        logger.error(f"Dead-lettered change events: {entries}")
+        redis_client = optimized_clickhouse_service.redis_client
+        if not redis_client:
+            return
+        try:
+            pipe = redis_client.pipeline()
+            pipe.lpush(DEAD_LETTER_KEY, *entries)
+            pipe.ltrim(DEAD_LETTER_KEY, 0, DEAD_LETTER_MAX - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not store dead-lettered change events: {e}")
+    
+    async def _flush_changes(self, batch: List[Dict[str, Any]]):
+        """Sync one batch of change events to ClickHouse (raises if the insert fails)"""
+        if any(change['collection'] == 'employee' for change in batch):
+            # Task rows pick up employee names from the cached lookup
+            await self._run_clickhouse(optimized_clickhouse_service.invalidate_employee_lookup)
+        
+        # updateLookup already shipped the current task document; no need to re-query it
+        task_docs = [
+            change['full_document'] for change in batch
+            if change['collection'] == 'tasks' and change['full_document']
+        ]
+        
+        if task_docs:
+            rows = await asyncio.to_thread(optimized_clickhouse_service.build_task_rows, task_docs)
+            if rows:
+                inserted = await self._run_clickhouse(
+                    partial(optimized_clickhouse_service.insert_task_rows, rows, raise_on_error=True)
+                )
+                self.performance_metrics['total_synced'] += inserted
+        
+        self.last_sync_time = datetime.utcnow()
+    
+    async def _daily_sync_scheduler(self):
+        """Run the daily maintenance sync at 02:00 UTC"""
+        while True:
+            now = datetime.utcnow()
+            next_run = now.replace(hour=2, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            await self.perform_daily_sync()
+    
+    def _load_resume_token(self) -> Optional[Dict[str, Any]]:
+        """Load the persisted change stream resume token (None when starting fresh)"""
+        redis_client = optimized_clickhouse_service.redis_client
+        if not redis_client:
+            return None
+        try:
+            token = redis_client.get(RESUME_TOKEN_KEY)
+            return json_util.loads(token) if token else None
+        except Exception as e:
+            logger.warning(f"Could not load change stream resume token: {e}")
+            return None
+    
+    def _save_resume_token(self, token: Dict[str, Any]):
+        """Persist the change stream resume token so restarts replay missed events"""
+        redis_client = optimized_clickhouse_service.redis_client
+        if not redis_client:
+            return
+        try:
+            redis_client.set(RESUME_TOKEN_KEY, json_util.dumps(token))
+        except Exception as e:
+            logger.warning(f"Could not save change stream resume token: {e}")
+    
     async def adaptive_sync(self):
         """Adaptive sync based on data changes and system load"""
-        async with self.sync_lock:
-            try:
-                # Check if we need full sync or incremental
-                if self.last_sync_time is None:
-                    await self.perform_initial_sync()
-                else:
-                    await self.perform_incremental_sync()
-                
-                # Daily performance sync
-                now = datetime.utcnow()
-                if now.hour == 2 and now.minute < 15:  # 2:00-2:15 AM daily
-                    await self.perform_daily_sync()
-                
-                self.last_sync_time = datetime.utcnow()
-                
-            except Exception as e:
-                logger.error(f"Adaptive sync failed: {e}")
-                raise
+        try:
+            # Check if we need full sync or incremental
+            if self.last_sync_time is None:
+                await self.perform_initial_sync()
+            else:
+                await self.perform_incremental_sync()
+            
+            # Daily performance sync
+            now = datetime.utcnow()
+            if now.hour == 2 and now.minute < 15:  # 2:00-2:15 AM daily
+                await self.perform_daily_sync()
+            
+            self.last_sync_time = datetime.utcnow()
+            
+        except Exception as e:
+            logger.error(f"Adaptive sync failed: {e}")
+            raise
     
     async def perform_initial_sync(self):
         """Optimized initial sync with progress tracking"""
         logger.info("🔄 Performing optimized initial sync")
         
-        # Get total counts for progress tracking
-        db = get_db()
-        total_tasks = db.tasks.count_documents({})
-        total_employees = db.employee.count_documents({})
+        # Get total counts for progress tracking (metadata counts, approximate is fine for logging)
+        db = self._db
+        total_tasks = db.tasks.estimated_document_count()
+        total_employees = db.employee.estimated_document_count()
         
         logger.info(f"📊 Initial sync scope: {total_tasks} tasks, {total_employees} employees")
         
         # Sync in phases to reduce memory pressure
-        await optimized_clickhouse_service.sync_tasks_from_mongodb_optimized(since=None)
+        async with self._locks['tasks']:
+            await self._sync_tasks(since=None)
+        self._unprobed_since.clear()
         
         logger.info("✅ Initial sync completed")
     
-    async def perform_incremental_sync(self):
+    async def perform_incremental_sync(self, force: bool = False):
         """Efficient incremental sync with change detection"""
         logger.info(f"🔄 Performing incremental sync since {self.last_sync_time}")
         
         # Check for changes in MongoDB collections
-        changes_detected = await self.detect_changes()
+        changes_detected = await self.detect_changes(force=force)
         
         if not changes_detected:
             logger.info("ℹ️ No changes detected, skipping sync")
@@ -120,60 +325,160 @@ class OptimizedSyncService:
         
         logger.info(f"📝 Changes detected: {changes_detected}")
         
-        # Sync only changed data
-        await optimized_clickhouse_service.sync_tasks_from_mongodb_optimized(
-            since=self.last_sync_time
-        )
+        # Sync only changed data; each collection holds only its own lock
+        await asyncio.gather(*[
+            asyncio.create_task(self._sync_collection(name, self._collection_since(name)))
+            for name in changes_detected
+        ])
         
         logger.info("✅ Incremental sync completed")
     
-    async def detect_changes(self) -> Dict[str, int]:
-        """Detect changes in MongoDB since last sync"""
+    async def _sync_collection(self, name: str, since: Optional[datetime]):
+        """Sync one changed collection under its own lock"""
+        async with self._locks[CHANGE_LOCKS[name]]:
+            if name == 'tasks':
+                await self._sync_tasks(since=since)
+            elif name == 'employees':
+                # Task rows pick up employee names from the cached lookup
+                await self._run_clickhouse(optimized_clickhouse_service.invalidate_employee_lookup)
+        # Only a completed sync closes a skipped window
+        self._unprobed_since.pop(name, None)
+    
+    def _collection_since(self, name: str) -> Optional[datetime]:
+        """Start of the change window for one collection, reaching back over skipped night probes"""
+        return self._unprobed_since.get(name, self.last_sync_time)
+    
+    async def _run_clickhouse(self, func, *args):
+        """Run a blocking ClickHouse call on the dedicated executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._clickhouse_executor, func, *args)
+    
+    async def _sync_tasks(self, since: Optional[datetime] = None, task_ids: Optional[List[Any]] = None):
+        """Stream task rows to ClickHouse through a bounded producer/consumer queue"""
+        if not optimized_clickhouse_service.client:
+            return
+        
+        batches = optimized_clickhouse_service.iter_task_row_batches(since=since, task_ids=task_ids, batch_size=self.batch_size)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SYNC_QUEUE_SIZE)
+        synced = 0
+        
+        async def produce():
+            try:
+                while True:
+                    # Pull the next batch off the event loop so in-flight inserts keep running
+                    batch = await asyncio.to_thread(next, batches, None)
+                    if batch is None:
+                        break
+                    await queue.put(batch)
+            finally:
+                for _ in range(SYNC_CONSUMERS):
+                    await queue.put(None)
+        
+        async def consume():
+            nonlocal synced
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                synced += await self._run_clickhouse(optimized_clickhouse_service.insert_task_rows, batch)
+        
+        await asyncio.gather(produce(), *[consume() for _ in range(SYNC_CONSUMERS)])
+        self.performance_metrics['total_synced'] += synced
+        logger.info(f"✅ Synced {synced} tasks to ClickHouse")
+    
+    async def detect_changes(self, force: bool = False) -> Dict[str, bool]:
+        """Detect changes in MongoDB since last sync (only changed collections are returned)"""
         if not self.last_sync_time:
-            return {'tasks': 1, 'employees': 1}  # Force full sync
+            return {'tasks': True, 'employees': True}  # Force full sync
         
-        db = get_db()
-        changes = {}
+        now = datetime.utcnow()
+        if not force:
+            # Just synced; nothing worth probing yet
+            if now - self.last_sync_time < MIN_CHANGE_PROBE_AGE:
+                return {}
+            
+            # Reuse a recent positive probe for the same sync window
+            if self._change_probe_cache:
+                cached_since, probed_at, cached_changes = self._change_probe_cache
+                if cached_since == self.last_sync_time and time.monotonic() - probed_at < CHANGE_PROBE_CACHE_TTL:
+                    return cached_changes
         
-        # Check tasks collection
-        task_changes = db.tasks.count_documents({
-            'updated_at': {'$gte': self.last_sync_time}
-        })
-        changes['tasks'] = task_changes
+        db = self._db
+        if not self._change_indexes_ready:
+            # create_index blocks on the server; keep it off the event loop
+            await asyncio.to_thread(self._ensure_change_indexes, db)
         
-        # Check employees collection
-        employee_changes = db.employee.count_documents({
-            'updated_at': {'$gte': self.last_sync_time}
-        })
-        changes['employees'] = employee_changes
+        collections = [('tasks', db.tasks), ('employees', db.employee), ('stage_tracking', db.file_stage_tracking)]
+        if not force and self._is_night_hour(now.hour):
+            # Quiet hours: new tasks are the only signal worth a round-trip;
+            # remember where the skipped collections' windows start so they aren't lost
+            for name, _ in collections[1:]:
+                self._unprobed_since.setdefault(name, self.last_sync_time)
+            collections = collections[:1]
         
-        # Check stage tracking collection
-        stage_changes = db.file_stage_tracking.count_documents({
-            'updated_at': {'$gte': self.last_sync_time}
-        })
-        changes['stage_tracking'] = stage_changes
+        # "Is there anything new?" is a single index probe per collection; run them concurrently
+        probes = await asyncio.gather(*[
+            asyncio.to_thread(self._has_changes_since, collection, self._collection_since(name))
+            for name, collection in collections
+        ])
+        changes = {name: True for (name, _), changed in zip(collections, probes) if changed}
+        for (name, _), changed in zip(collections, probes):
+            if not changed:
+                self._unprobed_since.pop(name, None)
         
+        if changes:
+            self._change_probe_cache = (self.last_sync_time, time.monotonic(), changes)
         return changes
     
+    def _has_changes_since(self, collection, since: datetime) -> bool:
+        """Check whether any document in the collection was updated at or after since"""
+        return collection.find_one(
+            {'updated_at': {'$gte': since}},
+            projection={'_id': 1},
+            sort=[('updated_at', DESCENDING)]
+        ) is not None
+    
+    def _ensure_change_indexes(self, db):
+        """Make sure the updated_at probes are index-backed"""
+        if self._change_indexes_ready:
+            return
+        try:
+            for collection in (db.tasks, db.employee, db.file_stage_tracking):
+                collection.create_index([('updated_at', DESCENDING)])
+            self._change_indexes_ready = True
+        except Exception as e:
+            logger.warning(f"Could not ensure updated_at indexes: {e}")
+    
     async def perform_daily_sync(self):
         """Daily comprehensive sync and cleanup"""
         logger.info("🌙 Performing daily maintenance sync")
         
         try:
-            # Sync employee performance metrics
-            await optimized_clickhouse_service.sync_employee_performance(days=30)
-            
-            # Clean up old data from ClickHouse
-            await self.cleanup_old_data()
-            
-            # Optimize ClickHouse tables
-            await self.optimize_tables()
+            async with AsyncExitStack() as stack:
+                # Fixed acquisition order so this can't deadlock with itself
+                for name in ('daily', 'tasks', 'employee', 'stage_tracking'):
+                    await stack.enter_async_context(self._locks[name])
+                await self._run_daily_maintenance()
             
             logger.info("✅ Daily maintenance completed")
             
         except Exception as e:
             logger.error(f"Daily maintenance failed: {e}")
     
+    async def _run_daily_maintenance(self):
+        """Daily maintenance steps; caller holds every sync lock"""
+        # Sync employee performance metrics (lives on the base service; logs its own failures)
+        await clickhouse_service.sync_employee_performance(days=30)
+        
+        # Clean up old data from ClickHouse
+        await self.cleanup_old_data()
+        
+        # Make buffered async inserts durable before optimizing
+        await self._run_clickhouse(optimized_clickhouse_service.flush_async_inserts)
+        
+        # Optimize ClickHouse tables
+        await self.optimize_tables()
+    
     async def cleanup_old_data(self):
         """Clean up old data to manage storage"""
         try:
@@ -189,8 +494,9 @@ class OptimizedSyncService:
     async def optimize_tables(self):
         """Optimize ClickHouse tables for better performance"""
         try:
-            # This would trigger table optimizations in ClickHouse
-            logger.info("⚡ Table optimization completed")
+            # Only yesterday's and today's partitions; background merges settle the rest
+            optimized = await self._run_clickhouse(optimized_clickhouse_service.optimize_recent_partitions)
+            logger.info(f"⚡ Table optimization completed ({optimized} partitions merged)")
             
         except Exception as e:
             logger.error(f"Table optimization failed: {e}")
@@ -212,34 +518,44 @@ class OptimizedSyncService:
         else:
             return self.sync_interval * 4
     
+    @staticmethod
+    def _is_night_hour(hour: int) -> bool:
+        """Night window used by calculate_adaptive_sleep (10 PM - 8 AM)"""
+        return hour > 22 or hour < 8
+    
     async def sync_specific_task(self, task_id: str):
-        """Sync specific task immediately (event-driven)"""
-        try:
-            logger.info(f"⚡ Event-driven sync for task {task_id}")
-            
-            # Get specific task from MongoDB
-            db = get_db()
-            task = db.tasks.find_one({'task_id': task_id})
-            
-            if task:
-                # Sync just this task
-                # This would be implemented in ClickHouse service
-                logger.info(f"✅ Synced task {task_id}")
-            
-        except Exception as e:
-            logger.error(f"Failed to sync specific task {task_id}: {e}")
+        """Queue a task for the next coalesced ClickHouse flush (event-driven)"""
+        logger.info(f"⚡ Event-driven sync queued for task {task_id}")
+        await self._enqueue_hot('task', task_id)
     
     async def sync_file_lifecycle_change(self, file_id: str, old_stage: str, new_stage: str):
-        """Sync file lifecycle changes immediately"""
-        try:
-            logger.info(f"🔄 File lifecycle change: {file_id} {old_stage} → {new_stage}")
-            
-            # Update ClickHouse immediately for real-time dashboard
-            # This would be implemented in ClickHouse service
-            logger.info(f"✅ Synced lifecycle change for {file_id}")
+        """Queue a file's tasks for the next coalesced ClickHouse flush"""
+        logger.info(f"🔄 File lifecycle change: {file_id} {old_stage} → {new_stage}")
+        await self._enqueue_hot('file', file_id)
+    
+    async def _enqueue_hot(self, kind: str, key: str):
+        """Put a hot-path sync request on the queue, starting the flusher on first use"""
+        if self._hot_flusher_task is None or self._hot_flusher_task.done():
+            self._hot_flusher_task = asyncio.create_task(self._hot_flusher())
+        await self._hot_queue.put((kind, key))
+    
+    async def _hot_flusher(self):
+        """Coalesce hot-path sync requests so single-task events become batch inserts"""
+        while True:
+            batch = await self._collect_batch(self._hot_queue)
+            task_ids = list({key for kind, key in batch if kind == 'task'})
+            file_ids = list({key for kind, key in batch if kind == 'file'})
             
-        except Exception as e:
-            logger.error(f"Failed to sync lifecycle change for {file_id}: {e}")
+            try:
+                db = self._db
+                query = {'$or': [{'task_id': {'$in': task_ids}}, {'file_id': {'$in': file_ids}}]}
+                ids = await asyncio.to_thread(lambda: [doc['_id'] for doc in db.tasks.find(query, {'_id': 1})])
+                if ids:
+                    await self._sync_tasks(task_ids=ids)
+                logger.info(f"✅ Synced {len(task_ids)} tasks and {len(file_ids)} files ({len(ids)} task rows)")
+            except Exception as e:
+                self.performance_metrics['errors'] += 1
+                logger.error(f"Failed to flush {len(batch)} hot-path syncs: {e}")
     
     async def get_performance_metrics(self) -> Dict[str, Any]:
         """Get sync service performance metrics"""
@@ -247,8 +563,7 @@ class OptimizedSyncService:
             **self.performance_metrics,
             'last_sync_time': self.last_sync_time.isoformat() if self.last_sync_time else None,
             'sync_interval': self.sync_interval,
-            'next_sync_in': self.calculate_adaptive_sleep(),
-            'change_tracker': dict(self.change_tracker)
+            'next_sync_in': self.calculate_adaptive_sleep()
         }
     
     async def manual_sync(self, force_full: bool = False) -> Dict[str, Any]:
@@ -260,7 +575,7 @@ class OptimizedSyncService:
                 self.last_sync_time = None
                 await self.perform_initial_sync()
             else:
-                await self.perform_incremental_sync()
+                await self.perform_incremental_sync(force=True)
             
             duration = time.time() - start_time
             
@@ -0,0 +1,55 @@
+"""
+Bulk write utilities for maintenance scripts
+Streams documents into unordered bulk_writes with a bounded number in flight
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, List, Mapping, Tuple
+
+from pymongo import UpdateOne
+
+BULK_WRITE_WORKERS = 10  # bulk_write batches in flight at once
+
+
+def parallel_bulk_write(
+    collection,
+    docs: Iterable[Mapping[str, Any]],
+    build_ops: Callable[[List[Mapping[str, Any]]], List[UpdateOne]],
+    batch_size: int,
+    workers: int = BULK_WRITE_WORKERS,
+) -> Tuple[int, int]:
+    """Turn docs into update batches and write them concurrently; returns (matched, modified)"""
+    matched_total = 0
+    modified_total = 0
+    in_flight = set()
+
+    def collect(done) -> None:
+        nonlocal matched_total, modified_total
+        for future in done:
+            result = future.result()
+            matched_total += result.matched_count
+            modified_total += result.modified_count
+
+    def submit(batch: List[Mapping[str, Any]]) -> None:
+        ops = build_ops(batch)
+        if not ops:
+            return
+        # Wait for a slot so the cursor can't race ahead of the writes
+        if len(in_flight) >= workers:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.difference_update(done)
+            collect(done)
+        in_flight.add(executor.submit(collection.bulk_write, ops, ordered=False))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch: List[Mapping[str, Any]] = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+        if batch:
+            submit(batch)
+
+        collect(wait(in_flight).done)
+
+    return matched_total, modified_total
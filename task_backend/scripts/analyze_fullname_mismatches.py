@@ -6,8 +6,8 @@ from typing import Any, Dict, List
 
 import pymysql
 import paramiko
-from difflib import SequenceMatcher
 from pymongo import MongoClient
+from rapidfuzz import fuzz
 from sshtunnel import SSHTunnelForwarder
 
 # Ensure the project root is on sys.path when running as a script
@@ -26,13 +26,17 @@ def analyze_fullname_mismatches() -> None:
     try:
         # Get MongoDB data
         db = get_db()
-        mongo_employees = list(db.employee.find({}, {'kekaemployeenumber': 1, 'fullname': 1, '_id': 0}))
+        # Covered by the index from scripts/create_employee_kekaemployeenumber_index.py
+        cursor = db.employee.find(
+            {'kekaemployeenumber': {'$ne': None}},
+            {'kekaemployeenumber': 1, 'fullname': 1, '_id': 0}
+        ).hint('kekaemployeenumber_1_fullname_1').batch_size(5000)
         
-        # Create MongoDB lookup dict
-        mongo_lookup = {emp['kekaemployeenumber']: emp['fullname'] for emp in mongo_employees if emp.get('kekaemployeenumber')}
+        # Stream the cursor straight into the MongoDB lookup dict
+        mongo_lookup = {emp['kekaemployeenumber']: emp.get('fullname') for emp in cursor if emp.get('kekaemployeenumber')}
         
         print(f'📊 Data Overview:')
-        print(f'  • MongoDB employees: {len(mongo_employees)}')
+        print(f'  • MongoDB employees: {len(mongo_lookup)}')
         print()
         
         # Load SSH private key and connect to MySQL
@@ -53,32 +57,27 @@ def analyze_fullname_mismatches() -> None:
             password=settings.mysql_password,
             database=settings.mysql_database,
             charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
+            cursorclass=pymysql.cursors.SSDictCursor
         )
         
         with connection.cursor() as cursor:
-            # Get MySQL data
-            cursor.execute('SELECT kekaemployeenumber, fullname FROM up_users WHERE kekaemployeenumber IS NOT NULL AND kekaemployeenumber != "" ORDER BY kekaemployeenumber')
-            mysql_employees = cursor.fetchall()
-            
-            print(f'  • MySQL employees: {len(mysql_employees)}')
-            print()
-            
-            # Get all MySQL codes for lookup
-            mysql_codes = {emp['kekaemployeenumber'] for emp in mysql_employees}
+            # Stream MySQL rows (server-side cursor, no sort needed for the comparison)
+            cursor.execute('SELECT kekaemployeenumber, fullname FROM up_users WHERE kekaemployeenumber IS NOT NULL AND kekaemployeenumber != ""')
             
             # Compare fullnames
             matches = 0
             mismatches = []
             mongo_only = []
             mysql_only = []
+            mysql_codes = set()
             
-            for mysql_emp in mysql_employees:
+            for mysql_emp in cursor:
                 mysql_code = mysql_emp['kekaemployeenumber']
                 mysql_name = mysql_emp['fullname'] or ''
+                mysql_codes.add(mysql_code)
                 
                 if mysql_code in mongo_lookup:
-                    mongo_name = mongo_lookup[mongo_code] or ''
+                    mongo_name = mongo_lookup[mysql_code] or ''
                     
                     # Normalize for comparison (case-insensitive, trim whitespace)
                     mysql_normalized = mysql_name.strip().lower()
@@ -87,17 +86,22 @@ def analyze_fullname_mismatches() -> None:
                     if mysql_normalized == mongo_normalized:
                         matches += 1
                     else:
-                        # Calculate similarity
-                        similarity = SequenceMatcher(None, mysql_normalized, mongo_normalized).ratio()
+                        # Calculate similarity (C++ Indel ratio, scaled to 0-1 like SequenceMatcher)
+                        similarity = fuzz.ratio(mysql_normalized, mongo_normalized) / 100.0
                         mismatches.append({
                             'kekaemployeenumber': mysql_code,
                             'mysql_fullname': mysql_name,
                             'mongo_fullname': mongo_name,
+                            'mysql_normalized': mysql_normalized,
+                            'mongo_normalized': mongo_normalized,
                             'similarity': similarity
                         })
                 else:
                     mysql_only.append(mysql_code)
             
+            print(f'  • MySQL employees: {len(mysql_codes)}')
+            print()
+            
             # Check for MongoDB-only employees
             for mongo_code in mongo_lookup.keys():
                 if mongo_code not in mysql_codes:
@@ -134,21 +138,31 @@ def analyze_fullname_mismatches() -> None:
             # Show categories of issues
             print('📋 Issue Categories:')
             
-            # Case differences
-            case_issues = [m for m in mismatches if m['mongo_fullname'].strip().lower() == m['mysql_fullname'].strip().lower()]
-            print(f'  • Case/whitespace differences: {len(case_issues)}')
+            # Classify every mismatch in a single pass using the stored normalized names
+            case_issues = []
+            partial_matches = []
+            very_different = []
+            mongo_missing = []
+            mysql_missing = []
+            for m in mismatches:
+                if m['mongo_normalized'] == m['mysql_normalized']:
+                    # Case differences
+                    case_issues.append(m)
+                elif 0.5 < m['similarity'] < 1.0:
+                    # Partial matches
+                    partial_matches.append(m)
+                if m['similarity'] <= 0.5:
+                    # Very different
+                    very_different.append(m)
+                # Missing values
+                if not m['mongo_normalized']:
+                    mongo_missing.append(m)
+                if not m['mysql_normalized']:
+                    mysql_missing.append(m)
             
-            # Partial matches
-            partial_matches = [m for m in mismatches if 0.5 < m['similarity'] < 1.0 and m not in case_issues]
+            print(f'  • Case/whitespace differences: {len(case_issues)}')
             print(f'  • Partial matches (50-99% similar): {len(partial_matches)}')
-            
-            # Very different
-            very_different = [m for m in mismatches if m['similarity'] <= 0.5]
             print(f'  • Very different names (≤50% similar): {len(very_different)}')
-            
-            # Missing values
-            mongo_missing = [m for m in mismatches if not m['mongo_fullname'] or not m['mongo_fullname'].strip()]
-            mysql_missing = [m for m in mismatches if not m['mysql_fullname'] or not m['mysql_fullname'].strip()]
             print(f'  • MongoDB missing/empty fullname: {len(mongo_missing)}')
             print(f'  • MySQL missing/empty fullname: {len(mysql_missing)}')
             
@@ -18,6 +18,9 @@ import os
 import argparse
 import logging
 
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
+
 # Add project root to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
@@ -26,6 +29,8 @@ from app.db.mongodb import get_db
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
+BULK_BATCH_SIZE = 1000
+
 
 def backfill_assigned_to(dry_run: bool = False):
     db = get_db()
@@ -41,39 +46,60 @@ def backfill_assigned_to(dry_run: bool = False):
         ]
     }
 
-    affected_tasks = list(db.tasks.find(query, {
-        "_id": 1,
-        "task_id": 1,
-        "employee_code": 1,
-        "status": 1,
-    }))
-
-    logger.info(f"Found {len(affected_tasks)} tasks with null assigned_to but employee_code set")
-
-    if not affected_tasks:
-        logger.info("Nothing to backfill. All tasks are consistent.")
-        return
+    # Lets the $match stage run as an index scan on (assigned_to, employee_code);
+    # a dry run must not build indexes on production
+    if not dry_run:
+        db.tasks.create_index([("assigned_to", 1), ("employee_code", 1)])
+
+    # Join each affected task to its employee name server-side
+    affected_tasks = db.tasks.aggregate([
+        {"$match": query},
+        # Two equality joins instead of one $expr/$or join so each stays an index lookup on employee
+        {"$lookup": {
+            "from": "employee",
+            "localField": "employee_code",
+            "foreignField": "employee_code",
+            "as": "emp_by_code",
+        }},
+        {"$lookup": {
+            "from": "employee",
+            "localField": "employee_code",
+            "foreignField": "kekaemployeenumber",
+            "as": "emp_by_keka",
+        }},
+        {"$project": {
+            "_id": 1,
+            "task_id": 1,
+            "employee_code": 1,
+            "assigned_to_name": {"$ifNull": [
+                {"$arrayElemAt": [
+                    {"$concatArrays": ["$emp_by_code.employee_name", "$emp_by_keka.employee_name"]}, 0
+                ]},
+                "Unknown",
+            ]},
+        }},
+    ], allowDiskUse=True, batchSize=5000)
 
-    # Build employee name lookup
-    employee_codes = list(set(t.get("employee_code") for t in affected_tasks if t.get("employee_code")))
-    employees = list(db.employee.find(
-        {"$or": [
-            {"employee_code": {"$in": employee_codes}},
-            {"kekaemployeenumber": {"$in": employee_codes}},
-        ]},
-        {"_id": 0, "employee_code": 1, "kekaemployeenumber": 1, "employee_name": 1}
-    ))
-    name_lookup = {}
-    for emp in employees:
-        code = emp.get("employee_code") or emp.get("kekaemployeenumber")
-        if code:
-            name_lookup[code] = emp.get("employee_name", "Unknown")
+    # Acknowledged by the primary only; no need to wait on majority for a backfill
+    tasks_collection = db.tasks.with_options(write_concern=WriteConcern(w=1))
 
+    total = 0
     updated = 0
     skipped = 0
+    ops = []
+
+    def flush():
+        nonlocal updated, skipped
+        result = tasks_collection.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+        skipped += len(ops) - result.modified_count
+        logger.info(f"Applied batch of {len(ops)}: {result.modified_count} modified")
+        ops.clear()
+
     for task in affected_tasks:
+        total += 1
         emp_code = task.get("employee_code")
-        emp_name = name_lookup.get(emp_code, "Unknown")
+        emp_name = task.get("assigned_to_name", "Unknown")
         task_id = task.get("task_id", str(task.get("_id")))
 
         if dry_run:
@@ -81,21 +107,25 @@ def backfill_assigned_to(dry_run: bool = False):
             updated += 1
             continue
 
-        result = db.tasks.update_one(
+        ops.append(UpdateOne(
             {"_id": task["_id"]},
             {"$set": {
                 "assigned_to": emp_code,
                 "assigned_to_name": emp_name,
             }}
-        )
-        if result.modified_count:
-            updated += 1
-            logger.info(f"Updated task {task_id}: assigned_to={emp_code}, assigned_to_name={emp_name}")
-        else:
-            skipped += 1
-            logger.warning(f"Skipped task {task_id}: no modification")
+        ))
+        if len(ops) >= BULK_BATCH_SIZE:
+            flush()
+
+    if ops:
+        flush()
+
+    logger.info(f"Found {total} tasks with null assigned_to but employee_code set")
+    if not total:
+        logger.info("Nothing to backfill. All tasks are consistent.")
+        return
 
-    logger.info(f"Backfill complete: {updated} updated, {skipped} skipped out of {len(affected_tasks)} total")
+    logger.info(f"Backfill complete: {updated} updated, {skipped} skipped out of {total} total")
 
 
 if __name__ == "__main__":
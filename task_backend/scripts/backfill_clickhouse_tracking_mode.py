@@ -7,6 +7,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import logging
+import time
 from datetime import datetime
 
 logging.basicConfig(
@@ -15,6 +16,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+MUTATION_POLL_INTERVAL = 2  # seconds between system.mutations checks
+MUTATION_TIMEOUT = 3600  # give up waiting after an hour
+
 def backfill_tracking_mode():
     """Backfill tracking_mode for existing ClickHouse records"""
     
@@ -75,33 +79,40 @@ def backfill_tracking_mode():
         logger.info("This may take a few minutes for large datasets...")
         
         try:
-            # Update records with empty file_id to STANDALONE
-            clickhouse_service.client.execute("""
-                ALTER TABLE task_events 
-                UPDATE tracking_mode = 'STANDALONE'
-                WHERE file_id = '' OR file_id IS NULL
-            """)
-            logger.info("✅ Updated STANDALONE tasks (empty file_id)")
-            
-            # Update records with file_id to FILE_BASED
+            # Single mutation: empty file_id -> STANDALONE, otherwise FILE_BASED,
+            # so every affected part is rewritten once
             clickhouse_service.client.execute("""
                 ALTER TABLE task_events 
-                UPDATE tracking_mode = 'FILE_BASED'
-                WHERE file_id != '' AND file_id IS NOT NULL
+                UPDATE tracking_mode = multiIf(file_id = '' OR file_id IS NULL, 'STANDALONE', 'FILE_BASED')
+                WHERE 1
             """)
-            logger.info("✅ Updated FILE_BASED tasks (with file_id)")
+            logger.info("✅ Updated STANDALONE (empty file_id) and FILE_BASED (with file_id) tasks")
             
         except Exception as e:
             logger.error(f"Failed to update tracking_mode: {e}")
             return False
         
-        # Step 5: Optimize table to apply mutations
-        logger.info("\n[Step 5] Optimizing table to apply mutations...")
+        # Step 5: Wait for the mutation to finish in the background merges
+        logger.info("\n[Step 5] Waiting for mutations to be applied...")
         try:
-            clickhouse_service.client.execute("OPTIMIZE TABLE task_events FINAL")
-            logger.info("✅ Table optimized")
+            deadline = time.monotonic() + MUTATION_TIMEOUT
+            while True:
+                pending = clickhouse_service.client.execute("""
+                    SELECT count()
+                    FROM system.mutations
+                    WHERE table = 'task_events'
+                    AND database = 'task_analytics'
+                    AND NOT is_done
+                """)[0][0]
+                if not pending:
+                    logger.info("✅ Mutations applied")
+                    break
+                if time.monotonic() > deadline:
+                    logger.warning(f"{pending} mutation(s) still running; verification may show partial results")
+                    break
+                time.sleep(MUTATION_POLL_INTERVAL)
         except Exception as e:
-            logger.warning(f"Failed to optimize table (non-critical): {e}")
+            logger.warning(f"Failed to check mutation status (non-critical): {e}")
         
         # Step 6: Verify results
         logger.info("\n[Step 6] Verifying backfill results...")
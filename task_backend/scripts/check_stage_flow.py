@@ -1,14 +1,28 @@
 #!/usr/bin/env python3
 """Check stage tracking flow for file_id=22 and other files"""
 import sys, os
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.db.mongodb import get_db
 
 db = get_db()
 
+# The four lookups are independent; issue them together so the script pays one round trip, not four
+with ThreadPoolExecutor(max_workers=4) as executor:
+    tasks_future = executor.submit(lambda: list(db.tasks.find(
+        {"file_id": "22"},
+        {"task_id":1,"title":1,"stage":1,"status":1,"assigned_to":1,"source":1,"file_id":1}
+    )))
+    ft_future = executor.submit(db.file_tracking.find_one, {"file_id": "22"})
+    pf_future = executor.submit(db.permit_files.find_one, {"file_id": "22"})
+    tasks_all_future = executor.submit(lambda: list(db.tasks.find(
+        {"file_id": {"$ne": None}},
+        {"task_id":1,"file_id":1,"source.permit_file_id":1}
+    ).limit(10)))
+
 # Check tasks for file_id=22 - source.permit_file_id vs file_id
 print("=== Tasks for file_id=22 ===")
-tasks = list(db.tasks.find({"file_id": "22"}, {"task_id":1,"title":1,"stage":1,"status":1,"assigned_to":1,"source":1}))
+tasks = tasks_future.result()
 for t in tasks:
     src = t.get("source", {})
     print(f"  task={t.get('task_id')} stage={t.get('stage')} status={t.get('status')} assigned_to={t.get('assigned_to')}")
@@ -16,7 +30,7 @@ for t in tasks:
 
 # Check file_tracking for file_id=22
 print("\n=== file_tracking for file_id=22 ===")
-ft = db.file_tracking.find_one({"file_id": "22"})
+ft = ft_future.result()
 if ft:
     ft.pop("_id", None)
     print(f"  current_stage={ft.get('current_stage')} current_status={ft.get('current_status')}")
@@ -27,7 +41,7 @@ else:
 
 # Check permit_files for file_id=22
 print("\n=== permit_files for file_id=22 ===")
-pf = db.permit_files.find_one({"file_id": "22"})
+pf = pf_future.result()
 if pf:
     pf.pop("_id", None)
     print(f"  file_name={pf.get('file_name')} status={pf.get('status')} current_stage={pf.get('current_stage')}")
@@ -37,10 +51,7 @@ else:
 
 # Check source.permit_file_id alignment
 print("\n=== source.permit_file_id vs file_id alignment (sample 10 tasks) ===")
-tasks_all = list(db.tasks.find(
-    {"file_id": {"$ne": None}},
-    {"task_id":1,"file_id":1,"source.permit_file_id":1}
-).limit(10))
+tasks_all = tasks_all_future.result()
 for t in tasks_all:
     fid = t.get("file_id")
     src_fid = t.get("source", {}).get("permit_file_id")
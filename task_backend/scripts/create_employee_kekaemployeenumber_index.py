@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure the project root is on sys.path when running as a script
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.db.mongodb import get_db
+
+INDEX_KEYS = [("kekaemployeenumber", 1), ("fullname", 1)]
+INDEX_NAME = "kekaemployeenumber_1_fullname_1"
+# Single-field index made redundant by INDEX_KEYS' prefix
+REDUNDANT_INDEX_NAME = "kekaemployeenumber_1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Create the (kekaemployeenumber, fullname) index on the MongoDB employee collection "
+            "used by the fullname analysis/fix scripts, and drop the redundant kekaemployeenumber_1."
+        )
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change; do not run DDL")
+    args = parser.parse_args()
+
+    db = get_db()
+    indexes = db.employee.index_information()
+
+    create = INDEX_NAME not in indexes
+    # A unique single-field index enforces something the compound one doesn't; leave it alone
+    redundant = indexes.get(REDUNDANT_INDEX_NAME)
+    drop = redundant is not None and not redundant.get("unique")
+
+    print(f"Create {INDEX_NAME}: {'yes' if create else 'already exists'}")
+    print(f"Drop {REDUNDANT_INDEX_NAME}: {'yes' if drop else 'no'}")
+    print(f"Dry run: {args.dry_run}")
+
+    if args.dry_run:
+        return
+
+    if create:
+        db.employee.create_index(INDEX_KEYS, name=INDEX_NAME)
+        print(f"Created {INDEX_NAME}")
+    # Only drop once the compound index is in place to serve the same lookups
+    if drop:
+        db.employee.drop_index(REDUNDANT_INDEX_NAME)
+        print(f"Dropped {REDUNDANT_INDEX_NAME}")
+
+
+if __name__ == "__main__":
+    main()
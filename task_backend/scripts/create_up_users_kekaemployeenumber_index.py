@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure the project root is on sys.path when running as a script
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.db.mysql import mysql_service
+
+INDEX_NAME = "idx_kekaemployeenumber"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Create a plain kekaemployeenumber index on the MySQL employee table "
+            "so the SQL->Mongo sync's chunked IN (...) lookups are range scans."
+        )
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be created; do not run DDL")
+    args = parser.parse_args()
+
+    with mysql_service.get_connection() as conn:
+        employee_tables = mysql_service.get_employee_tables(conn)
+        if not employee_tables:
+            print("No employee tables found in SQL database")
+            sys.exit(1)
+        table = employee_tables[0]
+
+        with conn.cursor() as cursor:
+            cursor.execute(f"SHOW INDEX FROM {table} WHERE Column_name = 'kekaemployeenumber' AND Seq_in_index = 1")
+            existing = sorted({row.get("Key_name") for row in cursor.fetchall()})
+            if existing:
+                print(f"{table} already has an index leading with kekaemployeenumber: {', '.join(existing)}")
+                return
+
+            print(f"Creating {INDEX_NAME} on {table} (kekaemployeenumber)")
+            print(f"Dry run: {args.dry_run}")
+            if args.dry_run:
+                return
+
+            cursor.execute(f"CREATE INDEX {INDEX_NAME} ON {table} (kekaemployeenumber)")
+            print(f"Created {INDEX_NAME} on {table}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from __future__ import annotations
 import argparse
 import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Mapping, Tuple
 
 from pymongo import UpdateOne
 
@@ -13,6 +13,42 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from app.db.mongodb import get_db
+from app.utils.bulk_write import parallel_bulk_write
+
+# Server-side equivalents of normalize_kekaemployeenumber / normalize_fullname,
+# used by the pipeline update so documents never leave the server
+_STRIPPED_KEKA = {
+    "$ltrim": {"input": {"$trim": {"input": {"$toString": "$kekaemployeenumber"}}}, "chars": "0"}
+}
+NORMALIZED_KEKA_EXPR = {
+    "$cond": [
+        {"$and": [
+            {"$in": [{"$type": "$kekaemployeenumber"}, ["string", "int", "long"]]},
+            {"$ne": ["$kekaemployeenumber", ""]},
+        ]},
+        {"$let": {
+            "vars": {"s": _STRIPPED_KEKA},
+            "in": {"$cond": [
+                {"$eq": ["$$s", ""]},
+                "0000",
+                {"$concat": [
+                    {"$substrBytes": ["0000", 0, {"$max": [0, {"$subtract": [4, {"$strLenCP": "$$s"}]}]}]},
+                    "$$s",
+                ]},
+            ]},
+        }},
+        "$kekaemployeenumber",
+    ]
+}
+NORMALIZED_FULLNAME_EXPR = {
+    "$cond": [{"$eq": [{"$type": "$fullname"}, "string"]}, {"$trim": {"input": "$fullname"}}, "$fullname"]
+}
+NEEDS_FIX_FILTER = {
+    "$expr": {"$or": [
+        {"$ne": [NORMALIZED_KEKA_EXPR, "$kekaemployeenumber"]},
+        {"$ne": [NORMALIZED_FULLNAME_EXPR, "$fullname"]},
+    ]}
+}
 
 
 def normalize_kekaemployeenumber(code: str) -> str:
@@ -21,11 +57,10 @@ def normalize_kekaemployeenumber(code: str) -> str:
         return code
     
     # Remove any existing leading zeros, then pad to 4 digits
-    clean_code = str(code).strip().lstrip('0')
-    if clean_code == '':
-        clean_code = '0'
+    clean_code = code if isinstance(code, str) else str(code)
+    clean_code = clean_code.strip().lstrip('0') or '0'
     
-    return clean_code.zfill(4)
+    return clean_code if len(clean_code) >= 4 else clean_code.zfill(4)
 
 
 def normalize_fullname(name: str) -> str:
@@ -37,7 +72,7 @@ def normalize_fullname(name: str) -> str:
     return str(name).strip()
 
 
-def build_ops(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
+def build_ops(docs: List[Mapping[str, Any]]) -> List[UpdateOne]:
     ops: List[UpdateOne] = []
 
     for doc in docs:
@@ -67,6 +102,16 @@ def build_ops(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
     return ops
 
 
+def apply_client_side(db, batch_size: int) -> Tuple[int, int]:
+    """Scan every employee, normalize in Python and write changed docs back in batches"""
+    # Fetch only the two fields being normalized, one write batch per getMore
+    cursor = db.employee.find(
+        {}, {"kekaemployeenumber": 1, "fullname": 1}
+    ).batch_size(batch_size)
+    
+    return parallel_bulk_write(db.employee, cursor, build_ops, batch_size)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description=(
@@ -76,6 +121,11 @@ def main() -> None:
     )
     parser.add_argument("--dry-run", action="store_true", help="Show what would be changed without applying updates")
     parser.add_argument("--batch-size", type=int, default=500, help="Bulk write batch size")
+    parser.add_argument(
+        "--client-side",
+        action="store_true",
+        help="Normalize in Python and bulk_write the results (for servers without pipeline updates, < 4.2)",
+    )
     args = parser.parse_args()
 
     db = get_db()
@@ -105,49 +155,32 @@ def main() -> None:
         print()
 
     if args.dry_run:
-        # Count how many need changes
-        need_keka_fix = 0
-        need_fullname_fix = 0
-        
-        for doc in db.employee.find({}, {"kekaemployeenumber": 1, "fullname": 1}):
-            keka = doc.get("kekaemployeenumber", "")
-            fullname = doc.get("fullname", "")
-            
-            if keka and normalize_kekaemployeenumber(keka) != keka:
-                need_keka_fix += 1
-            
-            if fullname and normalize_fullname(fullname) != fullname:
-                need_fullname_fix += 1
+        # Count how many need changes on the server; only two integers come back
+        stats = next(db.employee.aggregate([
+            {"$match": NEEDS_FIX_FILTER},
+            {"$group": {
+                "_id": None,
+                "keka": {"$sum": {"$cond": [{"$ne": [NORMALIZED_KEKA_EXPR, "$kekaemployeenumber"]}, 1, 0]}},
+                "fullname": {"$sum": {"$cond": [{"$ne": [NORMALIZED_FULLNAME_EXPR, "$fullname"]}, 1, 0]}},
+            }},
+        ]), {"keka": 0, "fullname": 0})
+        need_keka_fix = stats["keka"]
+        need_fullname_fix = stats["fullname"]
         
         print("📊 Dry-run statistics:")
         print(f"  • Docs needing kekaemployeenumber fix: {need_keka_fix}")
         print(f"  • Docs needing fullname fix: {need_fullname_fix}")
         return
 
-    # Apply changes
-    cursor = db.employee.find({})
-    
-    modified_total = 0
-    matched_total = 0
-
-    batch: List[Dict[str, Any]] = []
-    for doc in cursor:
-        batch.append(doc)
-        if len(batch) >= args.batch_size:
-            ops = build_ops(batch)
-            batch = []
-            if not ops:
-                continue
-            result = db.employee.bulk_write(ops, ordered=False)
-            matched_total += result.matched_count
-            modified_total += result.modified_count
-
-    if batch:
-        ops = build_ops(batch)
-        if ops:
-            result = db.employee.bulk_write(ops, ordered=False)
-            matched_total += result.matched_count
-            modified_total += result.modified_count
+    if args.client_side:
+        matched_total, modified_total = apply_client_side(db, args.batch_size)
+    else:
+        # One pipeline update; only documents whose normalized form differs are written
+        result = db.employee.update_many(
+            NEEDS_FIX_FILTER,
+            [{"$set": {"kekaemployeenumber": NORMALIZED_KEKA_EXPR, "fullname": NORMALIZED_FULLNAME_EXPR}}],
+        )
+        matched_total, modified_total = result.matched_count, result.modified_count
 
     print("\n=== Migration Results ===")
     print(f"Matched docs: {matched_total}")
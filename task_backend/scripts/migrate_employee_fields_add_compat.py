@@ -3,7 +3,7 @@ from __future__ import annotations
 import argparse
 import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Mapping, Tuple
 
 from pymongo import UpdateOne
 
@@ -13,9 +13,60 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from app.db.mongodb import get_db
-
-
-def build_ops(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
+from app.utils.bulk_write import parallel_bulk_write
+
+# MySQL-aligned field -> legacy field it is copied from
+COMPAT_FIELDS = {
+    "kekaemployeenumber": "employee_code",
+    "fullname": "employee_name",
+    "email": "contact_email",
+}
+
+
+# A field needs migrating when it is missing or null and its legacy field holds a value;
+# build_ops applies the same rule client-side
+def needs_copy_filter(new: str, old: str) -> Dict[str, Any]:
+    return {new: None, old: {"$ne": None}}
+
+
+NEEDS_MIGRATION_FILTER = {
+    "$or": [needs_copy_filter(new, old) for new, old in COMPAT_FIELDS.items()]
+}
+# Pipeline update: copy the legacy value only where the rule above holds; otherwise keep
+# the field as is (a missing field stays missing rather than becoming null)
+COMPAT_PIPELINE = [{
+    "$set": {
+        new: {"$cond": [
+            {"$and": [
+                {"$eq": [{"$ifNull": [f"${new}", None]}, None]},
+                {"$ne": [{"$ifNull": [f"${old}", None]}, None]},
+            ]},
+            f"${old}",
+            f"${new}",
+        ]}
+        for new, old in COMPAT_FIELDS.items()
+    }
+}]
+
+
+def compat_stats(db) -> Dict[str, int]:
+    """Total doc count plus, per new field, docs still missing it; one aggregate instead of four counts"""
+    facets: Dict[str, Any] = {"total": [{"$count": "n"}]}
+    for new, old in COMPAT_FIELDS.items():
+        facets[new] = [{"$match": needs_copy_filter(new, old)}, {"$count": "n"}]
+
+    # Only the six compat fields flow into $facet, not whole employee docs
+    projection: Dict[str, int] = {"_id": 0}
+    for new, old in COMPAT_FIELDS.items():
+        projection[new] = 1
+        projection[old] = 1
+
+    result = next(db.employee.aggregate([{"$project": projection}, {"$facet": facets}]))
+    # $count emits nothing for an empty match
+    return {name: (rows[0]["n"] if rows else 0) for name, rows in result.items()}
+
+
+def build_ops(docs: List[Mapping[str, Any]]) -> List[UpdateOne]:
     ops: List[UpdateOne] = []
 
     for doc in docs:
@@ -25,14 +76,11 @@ def build_ops(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
 
         set_ops: Dict[str, Any] = {}
 
-        if doc.get("kekaemployeenumber") is None and doc.get("employee_code") is not None:
-            set_ops["kekaemployeenumber"] = doc.get("employee_code")
-
-        if doc.get("fullname") is None and doc.get("employee_name") is not None:
-            set_ops["fullname"] = doc.get("employee_name")
-
-        if doc.get("email") is None and doc.get("contact_email") is not None:
-            set_ops["email"] = doc.get("contact_email")
+        # Same rule as COMPAT_PIPELINE: fill a missing/null new field from a non-null legacy value
+        for new, old in COMPAT_FIELDS.items():
+            legacy_value = doc.get(old)
+            if legacy_value is not None and doc.get(new) is None:
+                set_ops[new] = legacy_value
 
         if set_ops:
             ops.append(UpdateOne({"_id": _id}, {"$set": set_ops}))
@@ -40,6 +88,23 @@ def build_ops(docs: List[Dict[str, Any]]) -> List[UpdateOne]:
     return ops
 
 
+def apply_client_side(db, batch_size: int) -> Tuple[int, int]:
+    """Scan docs needing migration and copy legacy fields in Python, writing in batches"""
+    cursor = db.employee.find(
+        NEEDS_MIGRATION_FILTER,
+        {
+            "employee_code": 1,
+            "employee_name": 1,
+            "contact_email": 1,
+            "kekaemployeenumber": 1,
+            "fullname": 1,
+            "email": 1,
+        },
+    )
+
+    return parallel_bulk_write(db.employee, cursor, build_ops, batch_size)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description=(
@@ -49,14 +114,20 @@ def main() -> None:
     )
     parser.add_argument("--dry-run", action="store_true", help="Compute counts only; do not write to MongoDB")
     parser.add_argument("--batch-size", type=int, default=500, help="Bulk write batch size")
+    parser.add_argument(
+        "--client-side",
+        action="store_true",
+        help="Copy fields in Python and bulk_write the results (for servers without pipeline updates, < 4.2)",
+    )
     args = parser.parse_args()
 
     db = get_db()
 
-    total = db.employee.count_documents({})
-    need_keka = db.employee.count_documents({"kekaemployeenumber": {"$exists": False}, "employee_code": {"$exists": True}})
-    need_fullname = db.employee.count_documents({"fullname": {"$exists": False}, "employee_name": {"$exists": True}})
-    need_email = db.employee.count_documents({"email": {"$exists": False}, "contact_email": {"$exists": True}})
+    stats = compat_stats(db)
+    total = stats["total"]
+    need_keka = stats["kekaemployeenumber"]
+    need_fullname = stats["fullname"]
+    need_email = stats["email"]
 
     print("=== MongoDB Employee Field Compatibility Migration ===")
     print(f"Total employee docs: {total}")
@@ -68,54 +139,22 @@ def main() -> None:
     if args.dry_run:
         return
 
-    cursor = db.employee.find(
-        {
-            "$or": [
-                {"kekaemployeenumber": {"$exists": False}, "employee_code": {"$exists": True}},
-                {"fullname": {"$exists": False}, "employee_name": {"$exists": True}},
-                {"email": {"$exists": False}, "contact_email": {"$exists": True}},
-            ]
-        },
-        {
-            "employee_code": 1,
-            "employee_name": 1,
-            "contact_email": 1,
-            "kekaemployeenumber": 1,
-            "fullname": 1,
-            "email": 1,
-        },
-    )
-
-    modified_total = 0
-    matched_total = 0
-
-    batch: List[Dict[str, Any]] = []
-    for doc in cursor:
-        batch.append(doc)
-        if len(batch) >= args.batch_size:
-            ops = build_ops(batch)
-            batch = []
-            if not ops:
-                continue
-            result = db.employee.bulk_write(ops, ordered=False)
-            matched_total += result.matched_count
-            modified_total += result.modified_count
-
-    if batch:
-        ops = build_ops(batch)
-        if ops:
-            result = db.employee.bulk_write(ops, ordered=False)
-            matched_total += result.matched_count
-            modified_total += result.modified_count
+    if args.client_side:
+        matched_total, modified_total = apply_client_side(db, args.batch_size)
+    else:
+        # Single server-side update; no documents are transferred
+        result = db.employee.update_many(NEEDS_MIGRATION_FILTER, COMPAT_PIPELINE)
+        matched_total, modified_total = result.matched_count, result.modified_count
 
     print("\n=== Migration Results ===")
     print(f"Matched docs: {matched_total}")
     print(f"Modified docs: {modified_total}")
 
     # Post-check
-    after_need_keka = db.employee.count_documents({"kekaemployeenumber": {"$exists": False}, "employee_code": {"$exists": True}})
-    after_need_fullname = db.employee.count_documents({"fullname": {"$exists": False}, "employee_name": {"$exists": True}})
-    after_need_email = db.employee.count_documents({"email": {"$exists": False}, "contact_email": {"$exists": True}})
+    after_stats = compat_stats(db)
+    after_need_keka = after_stats["kekaemployeenumber"]
+    after_need_fullname = after_stats["fullname"]
+    after_need_email = after_stats["email"]
 
     print("\n=== Post-check ===")
     print(f"Still missing kekaemployeenumber (but have employee_code): {after_need_keka}")